@@ -31,6 +31,16 @@ MAX_IMAGE_DIMENSION = 10000     # Maximum width or height
 MIN_IMAGE_DIMENSION = 10
 THUMBNAIL_SIZE = (300, 300)
 PROXY_IMAGE_WIDTH = 700
+PROXY_RESIZE_SLACK = 1.15        # Images up to 15% wider than the proxy are not resized
+PROXY_REDUCING_GAP = 2.0         # Box pre-reduce for proxy resize: 2.0 fast, 3.0 closer to reference
+PROXY_RESAMPLE = 'BILINEAR'      # Proxy filter (Image.Resampling name): BILINEAR, BICUBIC, LANCZOS
+VIPS_MIN_PIXELS = 20_000_000     # Proxy via pyvips (if installed) above this size
+
+# === EDITOR SAVE (JPEG) ===
+JPEG_SAVE_QUALITY = 90
+JPEG_SAVE_SUBSAMPLING = 2        # 0 = 4:4:4, 2 = 4:2:0
+JPEG_SAVE_OPTIMIZE = False       # Extra Huffman pass: ~2x slower encode, a few % smaller
+JPEG_SAVE_PROGRESSIVE = True
 
 # === WATERMARK ===
 MIN_WATERMARK_SCALE = 5
@@ -52,6 +62,7 @@ ASPECT_RATIOS = {
     "16:9": (16, 9),
     "9:16": (9, 16)
 }
+ASPECT_RATIO_KEYS = tuple(ASPECT_RATIOS.keys())
 
 # === DEFAULT SETTINGS ===
 DEFAULT_SETTINGS = {
@@ -92,6 +103,7 @@ MIN_THREADS = 1
 MAX_THREADS = 8
 DEFAULT_THREADS = 2
 CACHE_TTL = 300  # seconds
+PROXY_CACHE_MAX_BYTES = 128 * 1024 * 1024  # Proxy side-cars per upload dir (LRU)
 
 # === PATHS ===
 def get_project_root() -> Path:
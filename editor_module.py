@@ -5,43 +5,105 @@ Image editing dialog with crop and rotate
 """
 
 import streamlit as st
+import functools
+import io
 import os
-from typing import Optional, Tuple
-from PIL import Image, ImageOps
-from streamlit_cropper import st_cropper
+import time
+import zlib
+from pathlib import Path
+from typing import Optional, Tuple, Dict
+import PIL
+from PIL import Image, ImageOps, features
 import config
+import watermarker_engine as engine
 from logger import get_logger
 from validators import validate_image_file, validate_dimensions
 
 logger = get_logger(__name__)
 
-def get_file_info_str(fpath: str, img: Image.Image) -> str:
+__all__ = [
+    'get_file_info_str',
+    'create_proxy_image',
+    'get_max_box',
+    'open_editor_dialog',
+]
+
+# === PILLOW-SIMD ===
+# Pillow-SIMD — drop-in заміна Pillow (той самий `import PIL`) з SSE4/AVX2
+# ядрами ресемплінгу. Її збірки мають суфікс ".postN" у номері версії.
+_pillow_simd = '.post' in PIL.__version__
+logger.info(f"Pillow {PIL.__version__} ({'SIMD' if _pillow_simd else 'stock'}) used for editor resampling")
+
+# Офіційні wheels Pillow вже зібрані з libjpeg-turbo (SIMD-кодек JPEG),
+# тож окремий PyTurboJPEG для Save не потрібен — лише перевіряємо збірку
+_jpeg_turbo = features.version('libjpeg_turbo')
+if _jpeg_turbo:
+    logger.info(f"JPEG codec: libjpeg-turbo {_jpeg_turbo}")
+else:
+    logger.warning("Pillow built without libjpeg-turbo — JPEG decode/encode will be slower")
+
+# === PYVIPS (опційно) ===
+# Для великих кадрів libvips декодує JPEG одразу зі зменшенням і ресемплить
+# потоково, без повнокадрового буфера. Потребує системної libvips.
+# Lazy import: libvips/cffi вантажиться лише при першому великому проксі,
+# а не при старті кожної сесії.
+@functools.lru_cache(maxsize=1)
+def _get_pyvips():
+    """Import pyvips on first use; None if it is not installed"""
+    try:
+        import pyvips
+    except (ImportError, OSError):
+        logger.info("pyvips not installed — editor proxies are built with Pillow")
+        return None
+    logger.info(f"pyvips {pyvips.__version__} enabled for large editor proxies")
+    return pyvips
+
+@functools.lru_cache(maxsize=128)
+def _format_file_info(fpath: str, mtime_ns: int, size_bytes: int, width: int, height: int) -> str:
+    """Format file info string (memoized on stat result and size)"""
+    size_mb = size_bytes / (1024 * 1024)
+    
+    if size_mb >= 1:
+        size_str = f"{size_mb:.2f} MB"
+    else:
+        size_str = f"{size_bytes/1024:.1f} KB"
+    
+    filename = os.path.basename(fpath)
+    return f"📄 **{filename}** &nbsp;•&nbsp; 📏 **{width}x{height}** &nbsp;•&nbsp; 💾 **{size_str}**"
+
+def get_file_info_str(
+    fpath: str,
+    width: int,
+    height: int,
+    stat: Optional[os.stat_result] = None
+) -> str:
     """
     Generate file info string for display
     
     Args:
         fpath: File path
-        img: PIL Image
+        width: Image width
+        height: Image height
+        stat: os.stat() result if the caller already has one
         
     Returns:
         Formatted info string
     """
     try:
-        size_bytes = os.path.getsize(fpath)
-        size_mb = size_bytes / (1024 * 1024)
-        
-        if size_mb >= 1:
-            size_str = f"{size_mb:.2f} MB"
-        else:
-            size_str = f"{size_bytes/1024:.1f} KB"
-        
-        filename = os.path.basename(fpath)
-        return f"📄 **{filename}** &nbsp;•&nbsp; 📏 **{img.width}x{img.height}** &nbsp;•&nbsp; 💾 **{size_str}**"
+        if stat is None:
+            stat = os.stat(fpath)
+        return _format_file_info(fpath, stat.st_mtime_ns, stat.st_size, width, height)
     
     except Exception as e:
         logger.error(f"Failed to generate file info: {e}")
         return "📄 File info unavailable"
 
+def _proxy_width(width: int, target_width: int) -> int:
+    """Proxy width for an image of the given width"""
+    if width <= target_width * config.PROXY_RESIZE_SLACK:
+        return width
+    return target_width
+
 def create_proxy_image(
     img: Image.Image,
     target_width: int = None
@@ -59,23 +121,29 @@ def create_proxy_image(
     if target_width is None:
         target_width = config.PROXY_IMAGE_WIDTH
     
+    w, h = img.size
+    
+    # Already small enough (or only slightly wider — ресемплінг заради кількох
+    # відсотків роздільності не вартий часу) — no copy, no validation
+    if _proxy_width(w, target_width) == w:
+        return img, 1.0
+    
+    # Calculate scale
+    ratio = target_width / w
+    new_h = max(1, int(h * ratio))
+    
     try:
-        w, h = img.size
-        
-        if w <= target_width:
-            return img, 1.0
-        
-        # Calculate scale
-        ratio = target_width / w
-        new_h = max(1, int(h * ratio))
-        
         # Validate
         validate_dimensions(target_width, new_h)
         
-        # Resize
+        # Resize: reducing_gap — спершу швидке box-зменшення (до 2× цілі
+        # за замовчуванням), далі config.PROXY_RESAMPLE (BILINEAR): для
+        # екранного проксі різниця з LANCZOS непомітна, а фільтр удвічі
+        # швидший (Save ріже оригінал)
         proxy = img.resize(
             (target_width, new_h),
-            Image.Resampling.LANCZOS
+            Image.Resampling[config.PROXY_RESAMPLE],
+            reducing_gap=config.PROXY_REDUCING_GAP
         )
         
         scale = w / target_width
@@ -87,6 +155,7 @@ def create_proxy_image(
         logger.error(f"Proxy creation failed: {e}")
         return img, 1.0
 
+@functools.lru_cache(maxsize=256)
 def get_max_box(
     img_w: int,
     img_h: int,
@@ -95,6 +164,8 @@ def get_max_box(
     """
     Calculate maximum crop box for given aspect ratio
     
+    Pure integer arithmetic on hashable inputs, memoized across reruns.
+    
     Args:
         img_w: Image width
         img_h: Image height
@@ -103,46 +174,422 @@ def get_max_box(
     Returns:
         Crop box tuple (left, top, width, height)
     """
-    try:
-        if aspect_data is None:
-            pad = 10
-            return (
-                pad,
-                pad,
-                max(10, img_w - 2*pad),
-                max(10, img_h - 2*pad)
-            )
+    if aspect_data is None:
+        pad = 10
+        return (pad, pad, max(10, img_w - 2*pad), max(10, img_h - 2*pad))
+    
+    ratio_w, ratio_h = aspect_data
+    if ratio_w == 0 or ratio_h == 0:
+        logger.warning(f"Invalid aspect ratio: {aspect_data}")
+        return (0, 0, img_w, img_h)
+    
+    # Fit by width, otherwise by height (цілочисельно — без похибки float)
+    try_h = img_w * ratio_h // ratio_w
+    if try_h <= img_h:
+        try_w = img_w
+    else:
+        try_w, try_h = img_h * ratio_w // ratio_h, img_h
+    
+    try_w = max(10, try_w)
+    try_h = max(10, try_h)
+    return ((img_w - try_w) // 2, (img_h - try_h) // 2, try_w, try_h)
+
+# === LOADERS ===
+# Кожен rerun діалогу (поворот, зміна пропорцій, рух рамки) виконує його
+# заново. Кешується лише проксі (_build_proxy, за (fpath, mtime)): після
+# Save mtime змінюється, і кеш інвалідується автоматично. Декодований кадр
+# не кешується — для PNG/WebP/HEIC draft() не працює, і в пам'яті лишався
+# б повнороздільний кадр; повторні промахи (інший кут) бере side-car.
+
+_RESAMPLE_MODES = ('RGB', 'RGBA', 'L', 'CMYK')
+
+def _decode_oriented(
+    fpath: str,
+    draft_size: Optional[Tuple[int, int]] = None
+) -> Image.Image:
+    """
+    Decode image with EXIF orientation applied (uncached)
+    
+    Режими, які Pillow ресемплить напряму (RGB, RGBA, L, CMYK), не
+    конвертуються: RGB робиться вже на зменшеному проксі або на вирізаному
+    фрагменті при Save, а не на всьому кадрі.
+    draft_size дозволяє libjpeg декодувати JPEG одразу в масштабі 1/2, 1/4
+    або 1/8 (не менше draft_size) — для проксі повна роздільність не потрібна.
+    Розмір задається для орієнтованого зображення.
+    """
+    with Image.open(fpath) as img_temp:
+        orientation = img_temp.getexif().get(0x0112, 1)
         
-        # Calculate ratio
-        ratio_w, ratio_h = aspect_data
-        if ratio_w == 0 or ratio_h == 0:
-            logger.warning(f"Invalid aspect ratio: {aspect_data}")
-            return (0, 0, img_w, img_h)
+        if draft_size and img_temp.format == 'JPEG':
+            # draft_size задано після EXIF-повороту, пікселі у файлі — до нього
+            if orientation in (5, 6, 7, 8):
+                draft_size = (draft_size[1], draft_size[0])
+            img_temp.draft('RGB', draft_size)
         
-        ratio_val = ratio_w / ratio_h
+        # in_place: без проміжної повнокадрової копії; без EXIF-повороту
+        # (найчастіший випадок) лише декодуємо
+        if orientation != 1:
+            ImageOps.exif_transpose(img_temp, in_place=True)
+        else:
+            img_temp.load()
+    
+    # Пікселі вже в пам'яті — закритий файл їм не потрібен.
+    # Палітра, 1-біт, 16-біт тощо: resize їх не інтерполює — конвертуємо одразу
+    if img_temp.mode not in _RESAMPLE_MODES:
+        return img_temp.convert('RGB')
+    return img_temp
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    """Convert to RGB unless already RGB"""
+    return img if img.mode == 'RGB' else img.convert('RGB')
+
+def _rotate(img: Image.Image, angle: int) -> Image.Image:
+    """
+    Apply user rotation (degrees, clockwise)
+    
+    Кут завжди кратний 90° (кнопки ±90°): rotate(expand=True) сам робить
+    transpose() без ресемплінгу.
+    """
+    angle %= 360
+    if angle == 0:
+        return img
+    return img.rotate(-angle, expand=True)
+
+def _proxy_sidecar_path(fpath: str) -> str:
+    """Path of the on-disk proxy cache stored next to the file"""
+    return f"{fpath}.proxy.webp"
+
+def _probe_size(fpath: str) -> Tuple[int, int]:
+    """Read EXIF-oriented image size from the header, without decoding pixels"""
+    with Image.open(fpath) as img:
+        w, h = img.size
+        # Orientation 5-8: зображення повернуте на 90°/270°
+        if img.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            return h, w
+        return w, h
+
+def _load_proxy_sidecar(
+    fpath: str,
+    mtime: float,
+    target_width: int
+) -> Optional[Tuple[Image.Image, int, int]]:
+    """
+    Load proxy side-car if it is fresh
+    
+    Returns:
+        Tuple of (proxy_image, full_width, full_height) or None
+    """
+    side_car = _proxy_sidecar_path(fpath)
+    try:
+        if os.path.getmtime(side_car) < mtime:
+            return None
         
-        # Try to fit by width
-        try_w = img_w
-        try_h = int(try_w / ratio_val)
+        full_w, full_h = _probe_size(fpath)
+        # with: WebP тримає файл відкритим і після load(); відкритий handle
+        # (на Windows) не дав би _evict_proxy_sidecars видалити side-car
+        with Image.open(side_car) as proxy:
+            if proxy.width != _proxy_width(full_w, target_width):
+                return None
+            proxy.load()
         
-        if try_h > img_h:
-            # Doesn't fit, try by height
-            try_h = img_h
-            try_w = int(try_h * ratio_val)
+        # mtime side-car = час останнього використання (для LRU-витіснення)
+        os.utime(side_car)
+        return proxy, full_w, full_h
+    
+    except OSError:
+        return None
+
+def _vips_proxy(
+    fpath: str,
+    target_width: int,
+    target_height: int
+) -> Optional[Image.Image]:
+    """
+    Build EXIF-oriented RGB proxy with libvips
+    
+    Args:
+        fpath: Path to image file
+        target_width: Proxy width
+        target_height: Proxy height (after EXIF rotation)
         
-        # Ensure positive dimensions
-        try_w = max(10, min(try_w, img_w))
-        try_h = max(10, min(try_h, img_h))
+    Returns:
+        Proxy image or None if pyvips is not installed or cannot read the file
+    """
+    pyvips = _get_pyvips()
+    if pyvips is None:
+        return None
+    
+    try:
+        # Точний розмір (size='force'): libvips округлює висоту, Pillow — ні;
+        # проксі має збігатися з Pillow-шляхом і перевіркою side-car
+        vimg = pyvips.Image.thumbnail(
+            fpath, target_width, height=target_height, size='force'
+        )
+        if vimg.hasalpha():
+            vimg = vimg.flatten()
+        if vimg.interpretation != 'srgb':
+            vimg = vimg.colourspace('srgb')
+        vimg = vimg.cast('uchar')
+        return Image.frombytes('RGB', (vimg.width, vimg.height), vimg.write_to_memory())
+    
+    except Exception as e:
+        logger.warning(f"pyvips proxy failed for {fpath}, falling back to Pillow: {e}")
+        return None
+
+def _evict_proxy_sidecars(directory: str, max_bytes: int = None):
+    """Delete least recently used proxy side-cars while the directory exceeds max_bytes"""
+    if max_bytes is None:
+        max_bytes = config.PROXY_CACHE_MAX_BYTES
+    
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.endswith('.proxy.webp') and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        Path(path).unlink(missing_ok=True)
+        total -= size
+        logger.debug(f"Evicted proxy side-car: {path}")
+
+def _save_proxy_sidecar(img_proxy: Image.Image, fpath: str):
+    """Persist proxy next to the file for the next editor open"""
+    try:
+        img_proxy.save(_proxy_sidecar_path(fpath), 'WEBP', quality=85, method=0)
+        _evict_proxy_sidecars(os.path.dirname(fpath) or '.')
+    except Exception as e:
+        logger.warning(f"Could not write proxy side-car for {fpath}: {e}")
+
+def _clamp_box(
+    rect: Dict,
+    scale: float,
+    orig_w: int,
+    orig_h: int
+) -> Tuple[int, int, int, int]:
+    """
+    Scale cropper box to full resolution and clamp it to image bounds
+    
+    Args:
+        rect: Cropper box (left, top, width, height) in proxy pixels
+        scale: Full-resolution / proxy scale factor
+        orig_w: Full image width
+        orig_h: Full image height
         
-        # Center the box
-        left = (img_w - try_w) // 2
-        top = (img_h - try_h) // 2
+    Returns:
+        Crop box (left, top, right, bottom), at least 1x1 px
+    """
+    left = max(0, int(rect['left'] * scale))
+    top = max(0, int(rect['top'] * scale))
+    width = min(int(rect['width'] * scale), orig_w - left)
+    height = min(int(rect['height'] * scale), orig_h - top)
+    
+    # Ensure positive dimensions
+    width = max(1, width)
+    height = max(1, height)
+    return (left, top, left + width, top + height)
+
+def _unrotate_box(
+    box: Tuple[int, int, int, int],
+    angle: int,
+    width: int,
+    height: int
+) -> Tuple[int, int, int, int]:
+    """
+    Map crop box from rotated image coordinates back to the unrotated image
+    
+    Args:
+        box: Crop box (left, top, right, bottom) in the rotated image
+        angle: User rotation (degrees, clockwise, multiple of 90)
+        width: Rotated image width
+        height: Rotated image height
         
-        return (left, top, try_w, try_h)
+    Returns:
+        Crop box (left, top, right, bottom) in the unrotated image
+    """
+    left, top, right, bottom = box
+    angle %= 360
+    
+    if angle == 90:
+        return (top, width - right, bottom, width - left)
+    if angle == 180:
+        return (width - right, height - bottom, width - left, height - top)
+    if angle == 270:
+        return (height - bottom, left, height - top, right)
+    return box
+
+# === SAVE OPTIONS ===
+# JPEG після crop (config): за замовчуванням 4:2:0 + progressive, без
+# другого проходу Huffman (optimize) — кодування ~2× швидше, різниця непомітна.
+_JPEG_SAVE_KWARGS = {
+    'quality': config.JPEG_SAVE_QUALITY,
+    'subsampling': config.JPEG_SAVE_SUBSAMPLING,
+    'progressive': config.JPEG_SAVE_PROGRESSIVE,
+    'optimize': config.JPEG_SAVE_OPTIMIZE,
+}
+# Архівна якість (і не-JPEG формати) — як раніше
+_ARCHIVE_SAVE_KWARGS = {'quality': 95, 'subsampling': 0, 'optimize': True}
+
+def _save_kwargs(fpath: str, archive: bool = False) -> Dict:
+    """PIL save options for the edited image"""
+    is_jpeg = os.path.splitext(fpath)[1].lower() in ('.jpg', '.jpeg')
+    if is_jpeg and not archive:
+        return dict(_JPEG_SAVE_KWARGS)
+    return dict(_ARCHIVE_SAVE_KWARGS)
+
+# === ATOMIC SAVE ===
+# Файл пишеться через .tmp + os.replace: читачі бачать або старий, або
+# новий файл, ніколи не напівзаписаний. Запис синхронний — помилку
+# (повний диск, права, формат) користувач бачить одразу в діалозі.
+def _atomic_save(img: Image.Image, fpath: str, save_kwargs: Dict):
+    """Encode image to a temp file, atomically replace fpath, refresh thumbnail"""
+    tmp_path = f"{fpath}.tmp"
+    ext = os.path.splitext(fpath)[1].lower()
+    fmt = Image.registered_extensions().get(ext)
+    
+    try:
+        # Кодуємо в пам'ять і пишемо одним write() — без дрібних записів
+        # через 16 KB буфер Pillow; розмір файлу відомий без stat
+        t_start = time.perf_counter()
+        buf = io.BytesIO()
+        img.save(buf, format=fmt, **save_kwargs)
+        with open(tmp_path, 'wb') as f:
+            f.write(buf.getbuffer())
+        os.replace(tmp_path, fpath)
+        logger.debug(
+            f"Edited image encoded in {(time.perf_counter() - t_start) * 1000:.0f} ms "
+            f"({img.width}x{img.height}, {buf.tell() / 1024:.0f} KB, {save_kwargs})"
+        )
     
     except Exception as e:
-        logger.error(f"Max box calculation failed: {e}")
-        return (0, 0, img_w, img_h)
+        logger.error(f"Save failed for {fpath}: {e}", exc_info=True)
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    
+    # Проксі side-car видаляємо явно: на ФС з mtime кроком 1–2 с (SMB, FAT,
+    # HFS+) відкриття і Save в одному кроці лишили б старий проксі «свіжим»
+    Path(_proxy_sidecar_path(fpath)).unlink(missing_ok=True)
+    
+    # Gallery thumbnail — з уже декодованого кадру, без повторного
+    # декодування файлу. Стару мініатюру не видаляємо: вона свіжа лише при
+    # mtime строго новішому за файл, тож при невдалому записі перебудується
+    engine.write_thumbnail(img, fpath)
+
+@st.cache_data(ttl=config.CACHE_TTL, max_entries=32, show_spinner=False)
+def _build_proxy(
+    fpath: str,
+    mtime: float,
+    angle: int,
+    target_width: int
+) -> Tuple[bytes, float, int, int]:
+    """
+    Build editor proxy for the rotated image
+    
+    Proxy is returned as PNG bytes: cheap to hash and pickle for the cache.
+    User rotation is applied to the proxy only; the full-resolution image
+    is rotated once, at Save. Unrotated proxy is also persisted to disk
+    ({fpath}.proxy.webp), so reopening the editor skips the decode.
+    
+    Returns:
+        Tuple of (proxy_png, scale_factor, full_width, full_height)
+        with full size given after rotation
+    """
+    side_car = _load_proxy_sidecar(fpath, mtime, target_width)
+    
+    if side_car is not None:
+        img_proxy, full_w, full_h = side_car
+    else:
+        # Full size comes from the header: decoded image is draft-downscaled
+        full_w, full_h = _probe_size(fpath)
+        
+        img_proxy = None
+        if full_w * full_h > config.VIPS_MIN_PIXELS:
+            target_height = max(1, full_h * target_width // full_w)
+            img_proxy = _vips_proxy(fpath, target_width, target_height)
+        
+        if img_proxy is None:
+            # Обмежуємо лише ширину (з запасом 2× для ресемплінгу); квадратний
+            # draft_size на альбомному кадрі змушував декодувати вдвічі більший масштаб
+            draft_w = target_width * 2
+            draft_size = (draft_w, max(1, draft_w * full_h // full_w))
+            img_base = _decode_oriented(fpath, draft_size)
+            img_proxy, _ = create_proxy_image(img_base, target_width)
+            img_proxy = _to_rgb(img_proxy)
+        
+        _save_proxy_sidecar(img_proxy, fpath)
+    
+    scale_factor = full_w / img_proxy.width
+    img_proxy = _rotate(img_proxy, angle)
+    if angle % 180:
+        full_w, full_h = full_h, full_w
+    
+    # compress_level=1: байти живуть лише в кеші, швидкість важливіша за розмір
+    buf = io.BytesIO()
+    img_proxy.save(buf, format='PNG', compress_level=1)
+    return buf.getvalue(), scale_factor, full_w, full_h
+
+def _rotate_step(file_id: str, delta: int):
+    """Rotate button callback: one batched state update per click"""
+    state = st.session_state['editor_state'][file_id]
+    # Нормалізуємо кут: -90 і 270 — один і той самий ключ кешу проксі
+    state['rot'] = (state['rot'] + delta) % 360
+
+@st.fragment
+def _save_panel(
+    fpath: str,
+    file_id: str,
+    angle: int,
+    crop_box: Optional[Tuple[int, int, int, int]],
+    orig_w: int,
+    orig_h: int,
+    T: dict
+):
+    """Archive-quality toggle and Save button (reruns on its own)"""
+    archive = st.checkbox(
+        T.get('chk_archive_quality', 'Archive quality'),
+        key=f"archive_{file_id}"
+    )
+    
+    # Save button
+    if st.button(
+        T.get('btn_save_edit', '💾 Save'),
+        type="primary",
+        use_container_width=True,
+        key=f"save_{file_id}"
+    ):
+        try:
+            if crop_box:
+                # Crop full-resolution image, then rotate only the cropped
+                # region. Повний кадр декодується повз кеш (він потрібен
+                # один раз) і звільняється одразу після crop.
+                # PIL crop — одна C-копія рядків; NumPy-зріз тут
+                # повільніший: np.asarray(img) копіює весь кадр.
+                img_full = _decode_oriented(fpath)
+                src_box = _unrotate_box(crop_box, angle, orig_w, orig_h)
+                final_image = _rotate(_to_rgb(img_full.crop(src_box)), angle)
+                del img_full  # refcount звільняє кадр одразу, gc.collect() не потрібен
+                
+                # Чекаємо на запис до тосту: при помилці діалог лишається
+                # відкритим з st.error, файл — без змін
+                with st.spinner(T.get('msg_saving', 'Saving...')):
+                    _atomic_save(final_image, fpath, _save_kwargs(fpath, archive))
+                
+                # Clean up state
+                st.session_state['editor_state'].pop(file_id, None)
+                
+                st.session_state['close_editor'] = True
+                st.toast(T.get('msg_edit_saved', '✅ Changes saved!'))
+                logger.info(f"Image edited and saved: {fpath}")
+                st.rerun()
+            else:
+                st.warning("No crop area selected")
+        
+        except Exception as e:
+            st.error(f"❌ Save failed: {e}")
+            logger.error(f"Save failed: {e}", exc_info=True)
 
 @st.dialog("🛠 Editor", width="large")
 def open_editor_dialog(fpath: str, T: dict):
@@ -157,44 +604,35 @@ def open_editor_dialog(fpath: str, T: dict):
         # Validate file
         validate_image_file(fpath)
         
-        file_id = os.path.basename(fpath)
+        # Короткий стабільний ID для ключів віджетів (і без юнікоду в них)
+        file_id = f"{zlib.crc32(fpath.encode('utf-8')):08x}"
         
-        # Initialize state
-        if f'rot_{file_id}' not in st.session_state:
-            st.session_state[f'rot_{file_id}'] = 0
-        
-        if f'reset_{file_id}' not in st.session_state:
-            st.session_state[f'reset_{file_id}'] = 0
-        
-        if f'def_coords_{file_id}' not in st.session_state:
-            st.session_state[f'def_coords_{file_id}'] = None
+        # Initialize state (один словник на файл; лише скаляри —
+        # PIL-зображення в session_state не зберігаються)
+        state = st.session_state['editor_state'].setdefault(
+            file_id, {'rot': 0}
+        )
         
-        # Load original image
+        # Load proxy for performance (cached across reruns)
+        angle = state['rot']
         try:
-            with Image.open(fpath) as img_temp:
-                img_full = ImageOps.exif_transpose(img_temp)
-                img_full = img_full.convert('RGB')
-            
-            # Apply rotation if needed
-            angle = st.session_state[f'rot_{file_id}']
-            if angle != 0:
-                img_full = img_full.rotate(
-                    -angle,
-                    expand=True,
-                    resample=Image.BICUBIC
-                )
+            # Один stat на rerun: mtime для кешів і розмір для підпису
+            file_stat = os.stat(fpath)
+            mtime = file_stat.st_mtime
+            proxy_png, scale_factor, orig_w, orig_h = _build_proxy(
+                fpath, mtime, angle, config.PROXY_IMAGE_WIDTH
+            )
+            img_proxy = Image.open(io.BytesIO(proxy_png))
         
         except Exception as e:
             st.error(f"❌ Error loading image: {e}")
             logger.error(f"Image load failed: {e}")
             return
         
-        # Create proxy for performance
-        img_proxy, scale_factor = create_proxy_image(img_full)
         proxy_w, proxy_h = img_proxy.size
         
         # Display file info
-        st.caption(get_file_info_str(fpath, img_full))
+        st.caption(get_file_info_str(fpath, orig_w, orig_h, file_stat))
         
         # Layout
         col_canvas, col_controls = st.columns([3, 1], gap="small")
@@ -203,19 +641,20 @@ def open_editor_dialog(fpath: str, T: dict):
         with col_controls:
             st.markdown("**🔄 Rotate**")
             
-            # Rotation buttons
+            # Rotation buttons: стан змінюється в on_click до rerun діалогу,
+            # тож явний st.rerun() (повний rerun застосунку) не потрібен
             c1, c2 = st.columns(2)
             with c1:
-                if st.button("↺ -90°", use_container_width=True, key=f"rot_left_{file_id}"):
-                    st.session_state[f'rot_{file_id}'] -= 90
-                    st.session_state[f'reset_{file_id}'] += 1
-                    st.rerun()
+                st.button(
+                    "↺ -90°", use_container_width=True, key=f"rot_left_{file_id}",
+                    on_click=_rotate_step, args=(file_id, -90)
+                )
             
             with c2:
-                if st.button("↻ +90°", use_container_width=True, key=f"rot_right_{file_id}"):
-                    st.session_state[f'rot_{file_id}'] += 90
-                    st.session_state[f'reset_{file_id}'] += 1
-                    st.rerun()
+                st.button(
+                    "↻ +90°", use_container_width=True, key=f"rot_right_{file_id}",
+                    on_click=_rotate_step, args=(file_id, 90)
+                )
             
             st.divider()
             st.markdown("**✂️ Crop**")
@@ -223,7 +662,7 @@ def open_editor_dialog(fpath: str, T: dict):
             # Aspect ratio selection
             aspect_choice = st.selectbox(
                 T.get('lbl_aspect', 'Aspect Ratio'),
-                list(config.ASPECT_RATIOS.keys()),
+                config.ASPECT_RATIO_KEYS,
                 label_visibility="collapsed",
                 key=f"asp_{file_id}"
             )
@@ -235,11 +674,17 @@ def open_editor_dialog(fpath: str, T: dict):
         
         # === CANVAS ===
         with col_canvas:
-            # Генеруємо унікальний ID. При зміні aspect_choice або reset, 
-            # віджет перествориться і скине рамку в дефолтне положення.
-            cropper_id = f"crp_{file_id}_{st.session_state[f'reset_{file_id}']}_{aspect_choice}"
+            # Ключ залежить лише від кута і пропорцій: при їх зміні віджет
+            # перествориться і скине рамку в дефолтне положення, інакше
+            # (зміна якості, rerun після руху рамки) — лишається змонтованим.
+            cropper_id = f"crp_{file_id}_{angle}_{aspect_choice}"
             
             try:
+                # Lazy import: компонент потрібен лише при відкритому редакторі
+                from streamlit_cropper import st_cropper
+                # realtime_update=True: рамка надсилається один раз після
+                # відпускання миші (fabric object:modified), а не на кожен кадр;
+                # False чекає подвійного кліку — без нього Save різав би дефолтну рамку
                 rect = st_cropper(
                     img_proxy,
                     realtime_update=True,
@@ -262,28 +707,9 @@ def open_editor_dialog(fpath: str, T: dict):
             
             if rect:
                 try:
-                    # Scale coordinates back to original
-                    left = int(rect['left'] * scale_factor)
-                    top = int(rect['top'] * scale_factor)
-                    width = int(rect['width'] * scale_factor)
-                    height = int(rect['height'] * scale_factor)
-                    
-                    # Clamp to image bounds
-                    orig_w, orig_h = img_full.size
-                    left = max(0, left)
-                    top = max(0, top)
-                    
-                    if left + width > orig_w:
-                        width = orig_w - left
-                    if top + height > orig_h:
-                        height = orig_h - top
-                    
-                    # Ensure positive dimensions
-                    width = max(1, width)
-                    height = max(1, height)
-                    
-                    crop_box = (left, top, left + width, top + height)
-                    real_w, real_h = width, height
+                    crop_box = _clamp_box(rect, scale_factor, orig_w, orig_h)
+                    real_w = crop_box[2] - crop_box[0]
+                    real_h = crop_box[3] - crop_box[1]
                 
                 except Exception as e:
                     logger.error(f"Crop calculation failed: {e}")
@@ -291,54 +717,9 @@ def open_editor_dialog(fpath: str, T: dict):
             # Display dimensions
             st.info(f"📏 **{real_w} × {real_h}** px")
             
-            # Save button
-            if st.button(
-                T.get('btn_save_edit', '💾 Save'),
-                type="primary",
-                use_container_width=True,
-                key=f"save_{file_id}"
-            ):
-                try:
-                    if crop_box:
-                        # Crop image
-                        final_image = img_full.crop(crop_box)
-                        
-                        # Save with high quality
-                        final_image.save(
-                            fpath,
-                            quality=95,
-                            subsampling=0,
-                            optimize=True
-                        )
-                        
-                        # Remove thumbnail cache
-                        thumb_path = f"{fpath}.thumb.jpg"
-                        if os.path.exists(thumb_path):
-                            try:
-                                os.remove(thumb_path)
-                            except Exception:
-                                pass
-                        
-                        # Clean up state
-                        keys_to_delete = [
-                            f'rot_{file_id}',
-                            f'reset_{file_id}',
-                            f'def_coords_{file_id}'
-                        ]
-                        for k in keys_to_delete:
-                            if k in st.session_state:
-                                del st.session_state[k]
-                        
-                        st.session_state['close_editor'] = True
-                        st.toast(T.get('msg_edit_saved', '✅ Changes saved!'))
-                        logger.info(f"Image edited and saved: {fpath}")
-                        st.rerun()
-                    else:
-                        st.warning("No crop area selected")
-                
-                except Exception as e:
-                    st.error(f"❌ Save failed: {e}")
-                    logger.error(f"Save failed: {e}", exc_info=True)
+            # Архівна якість і Save — окремий фрагмент: перемикання чекбокса
+            # не перезапускає діалог і не пересилає проксі в cropper заново
+            _save_panel(fpath, file_id, angle, crop_box, orig_w, orig_h, T)
     
     except Exception as e:
         st.error(f"❌ Editor error: {e}")
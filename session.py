@@ -37,6 +37,7 @@ def init_session_state():
         # editing_file, editor_open, close_editor — видалено.
         # @st.dialog викликається напряму всередині if st.button() —
         # жодних прапорців не потрібно.
+        'editor_state': {},         # file_id -> {'rot'}
         'results': None,
         'cancel_token': None,       # CancellationToken | None
         'processing_active': False, # True поки йде batch
@@ -0,0 +1,334 @@
+"""
+Watermarker Pro v7.0 - Unit Tests
+==================================
+Test suite for editor module helpers
+"""
+
+import pytest
+import gc
+import io
+import os
+import tempfile
+import warnings
+from PIL import Image
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import editor_module as editor
+import watermarker_engine as engine
+
+# === FIXTURES ===
+
+@pytest.fixture
+def make_image():
+    """Factory for temporary test images (size, format, mode, EXIF orientation)"""
+    paths = []
+    
+    def _make(size=(1400, 700), fmt='JPEG', mode='RGB', orientation=None):
+        img = Image.new(mode, size, color='white')
+        save_kwargs = {}
+        if orientation:
+            exif = Image.Exif()
+            exif[0x0112] = orientation
+            save_kwargs['exif'] = exif
+        suffix = '.png' if fmt == 'PNG' else '.jpg'
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+            img.save(f.name, fmt, **save_kwargs)
+        paths.append(f.name)
+        return f.name
+    
+    yield _make
+    for path in paths:
+        for p in (path, editor._proxy_sidecar_path(path)):
+            if os.path.exists(p):
+                os.unlink(p)
+
+@pytest.fixture
+def temp_image(make_image):
+    """Create temporary landscape test image"""
+    return make_image()
+
+# === FILE INFO TESTS ===
+
+def test_get_file_info_str(temp_image):
+    """Test file info string contents"""
+    info = editor.get_file_info_str(temp_image, 1400, 700)
+    assert os.path.basename(temp_image) in info
+    assert "1400x700" in info
+    assert "KB" in info
+
+def test_get_file_info_str_with_stat(temp_image):
+    """Test caller-supplied stat result gives the same string"""
+    stat = os.stat(temp_image)
+    assert editor.get_file_info_str(temp_image, 1400, 700, stat) == \
+        editor.get_file_info_str(temp_image, 1400, 700)
+
+def test_get_file_info_str_missing():
+    """Test file info fallback for missing file"""
+    assert "unavailable" in editor.get_file_info_str("/nonexistent/file.jpg", 10, 10)
+
+# === PROXY TESTS ===
+
+def test_create_proxy_image_downscales():
+    """Test proxy is downscaled to target width"""
+    img = Image.new('RGB', (1400, 700))
+    proxy, scale = editor.create_proxy_image(img, 700)
+    assert proxy.size == (700, 350)
+    assert scale == 2.0
+
+def test_create_proxy_image_small_input():
+    """Test small image is returned as-is"""
+    img = Image.new('RGB', (500, 300))
+    proxy, scale = editor.create_proxy_image(img, 700)
+    assert proxy is img
+    assert scale == 1.0
+
+def test_create_proxy_image_slightly_wider():
+    """Test image within resize slack is not resampled"""
+    img = Image.new('RGB', (780, 400))
+    proxy, scale = editor.create_proxy_image(img, 700)
+    assert proxy is img
+    assert scale == 1.0
+
+def test_build_proxy(temp_image):
+    """Test cached proxy builder returns PNG bytes and full size"""
+    mtime = os.path.getmtime(temp_image)
+    proxy_png, scale, full_w, full_h = editor._build_proxy(temp_image, mtime, 0, 700)
+    proxy = Image.open(io.BytesIO(proxy_png))
+    assert proxy.format == 'PNG'
+    assert proxy.size == (700, 350)
+    assert (full_w, full_h) == (1400, 700)
+    assert scale == 2.0
+
+def test_build_proxy_rotated(temp_image):
+    """Test rotation swaps full-size dimensions"""
+    mtime = os.path.getmtime(temp_image)
+    proxy_png, scale, full_w, full_h = editor._build_proxy(temp_image, mtime, 90, 700)
+    proxy = Image.open(io.BytesIO(proxy_png))
+    assert (full_w, full_h) == (700, 1400)
+    assert proxy.size == (350, 700)
+    assert scale == 2.0
+
+def test_build_proxy_sidecar(temp_image):
+    """Test proxy side-car is written and reused"""
+    mtime = os.path.getmtime(temp_image)
+    editor._build_proxy(temp_image, mtime, 0, 700)
+    side_car = editor._proxy_sidecar_path(temp_image)
+    assert os.path.exists(side_car)
+    
+    cached = editor._load_proxy_sidecar(temp_image, mtime, 700)
+    assert cached is not None
+    proxy, full_w, full_h = cached
+    assert proxy.size == (700, 350)
+    assert (full_w, full_h) == (1400, 700)
+    
+    # Other proxy width — side-car is stale
+    assert editor._load_proxy_sidecar(temp_image, mtime, 500) is None
+
+def test_load_proxy_sidecar_closes_file(temp_image):
+    """Test side-car file handle is closed on hit and on width mismatch"""
+    mtime = os.path.getmtime(temp_image)
+    editor._build_proxy(temp_image, mtime, 0, 700)
+    
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', ResourceWarning)
+        cached = editor._load_proxy_sidecar(temp_image, mtime, 700)
+        assert cached[0].size == (700, 350)
+        assert editor._load_proxy_sidecar(temp_image, mtime, 500) is None
+        del cached
+        gc.collect()
+    assert not [w for w in caught if issubclass(w.category, ResourceWarning)]
+
+def test_evict_proxy_sidecars():
+    """Test oldest side-cars are evicted over the size cap"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i in range(3):
+            path = os.path.join(tmp_dir, f"img{i}.jpg.proxy.webp")
+            with open(path, 'wb') as f:
+                f.write(b"x" * 100)
+            os.utime(path, (1000 + i, 1000 + i))
+            paths.append(path)
+        
+        editor._evict_proxy_sidecars(tmp_dir, max_bytes=250)
+        assert [os.path.exists(p) for p in paths] == [False, True, True]
+
+def test_decode_oriented_draft(make_image):
+    """Test JPEG draft decode keeps proxy scale against full size"""
+    path = make_image((3000, 1500))
+    mtime = os.path.getmtime(path)
+    assert editor._decode_oriented(path, (700, 700)).size == (1500, 750)
+    
+    proxy_png, scale, full_w, full_h = editor._build_proxy(path, mtime, 0, 700)
+    assert (full_w, full_h) == (3000, 1500)
+    assert Image.open(io.BytesIO(proxy_png)).width == 700
+    assert scale == pytest.approx(3000 / 700)
+
+def test_build_proxy_draft_landscape(make_image):
+    """Test draft size is bounded by proxy width, not a square"""
+    path = make_image((6000, 4000))
+    mtime = os.path.getmtime(path)
+    assert editor._decode_oriented(path, (1400, 933)).size == (1500, 1000)
+    
+    proxy_png, scale, full_w, full_h = editor._build_proxy(path, mtime, 0, 700)
+    assert (full_w, full_h) == (6000, 4000)
+    assert Image.open(io.BytesIO(proxy_png)).size == (700, 466)
+
+def test_decode_oriented_exif_rotation(make_image):
+    """Test EXIF orientation is applied and probed from the header"""
+    path = make_image((400, 200), orientation=6)
+    assert editor._probe_size(path) == (200, 400)
+    assert editor._decode_oriented(path).size == (200, 400)
+
+def test_decode_oriented_keeps_rgba(make_image):
+    """Test RGBA source is resampled natively and proxy is RGB"""
+    path = make_image(fmt='PNG', mode='RGBA')
+    mtime = os.path.getmtime(path)
+    assert editor._decode_oriented(path).mode == 'RGBA'
+    
+    proxy_png, _, _, _ = editor._build_proxy(path, mtime, 0, 700)
+    assert Image.open(io.BytesIO(proxy_png)).mode == 'RGB'
+
+def test_build_proxy_vips_matches_pillow(make_image, monkeypatch):
+    """Test libvips proxy matches the Pillow path for a large EXIF-rotated JPEG"""
+    pytest.importorskip("pyvips")
+    # 26 MP > VIPS_MIN_PIXELS; EXIF 6 — у файлі 6000x4300, орієнтований
+    # 4300x6000; висота проксі 976.7 — libvips округлив би її до 977
+    path = make_image((6000, 4300), orientation=6)
+    mtime = os.path.getmtime(path)
+    
+    vips_proxy = editor._vips_proxy(path, 700, 976)
+    assert vips_proxy is not None
+    assert vips_proxy.mode == 'RGB'
+    assert vips_proxy.size == (700, 976)
+    
+    editor._build_proxy.clear()
+    vips_result = editor._build_proxy(path, mtime, 0, 700)
+    assert editor._load_proxy_sidecar(path, mtime, 700) is not None
+    
+    # Той самий файл без side-car і без libvips — через Pillow
+    os.unlink(editor._proxy_sidecar_path(path))
+    editor._build_proxy.clear()
+    monkeypatch.setattr(editor, '_get_pyvips', lambda: None)
+    pil_result = editor._build_proxy(path, mtime, 0, 700)
+    
+    for result in (vips_result, pil_result):
+        proxy_png, scale, full_w, full_h = result
+        assert Image.open(io.BytesIO(proxy_png)).size == (700, 976)
+        assert (full_w, full_h) == (4300, 6000)
+        assert scale == pytest.approx(4300 / 700)
+
+# === ROTATION TESTS ===
+
+def test_rotate_clockwise():
+    """Test user rotation is clockwise and 0° returns the image itself"""
+    img = Image.new('RGB', (40, 20), color='white')
+    img.putpixel((0, 0), (255, 0, 0))
+    for angle in (-270, -180, -90, 90, 180, 270):
+        expected = img.transpose({
+            90: Image.Transpose.ROTATE_270,
+            180: Image.Transpose.ROTATE_180,
+            270: Image.Transpose.ROTATE_90,
+        }[angle % 360])
+        assert editor._rotate(img, angle).tobytes() == expected.tobytes()
+    assert editor._rotate(img, 0) is img
+    assert editor._rotate(img, 360) is img
+
+def test_unrotate_box_matches_rotated_crop():
+    """Test crop-then-rotate equals rotate-then-crop"""
+    img = Image.effect_noise((40, 20), 64).convert('RGB')
+    box = (3, 5, 11, 17)
+    for angle in (0, 90, 180, 270, -90):
+        rotated = editor._rotate(img, angle)
+        expected = rotated.crop(box)
+        src_box = editor._unrotate_box(box, angle, rotated.width, rotated.height)
+        result = editor._rotate(img.crop(src_box), angle)
+        assert result.tobytes() == expected.tobytes()
+
+def test_clamp_box():
+    """Test cropper box is scaled and clamped to image bounds"""
+    rect = {'left': 10, 'top': 20, 'width': 100, 'height': 50}
+    assert editor._clamp_box(rect, 2.0, 1400, 700) == (20, 40, 220, 140)
+    
+    # Box sticking out of the image is cut at the edges
+    rect = {'left': -5, 'top': 300, 'width': 800, 'height': 100}
+    assert editor._clamp_box(rect, 2.0, 1400, 700) == (0, 600, 1400, 700)
+
+# === SAVE TESTS ===
+
+def test_save_kwargs():
+    """Test fast JPEG options and archive/non-JPEG fallback"""
+    fast = editor._save_kwargs("/path/photo.JPG")
+    assert fast['quality'] == 90
+    assert fast['progressive'] is True
+    assert fast['optimize'] is False
+    
+    assert editor._save_kwargs("/path/photo.jpg", archive=True)['optimize'] is True
+    assert editor._save_kwargs("/path/image.png")['optimize'] is True
+
+def test_atomic_save(temp_image):
+    """Test save replaces file and removes the proxy side-car"""
+    mtime = os.path.getmtime(temp_image)
+    editor._build_proxy(temp_image, mtime, 0, 700)
+    assert editor._load_proxy_sidecar(temp_image, mtime, 700) is not None
+    
+    img = Image.new('RGB', (300, 200), color='red')
+    editor._atomic_save(img, temp_image, editor._save_kwargs(temp_image))
+    
+    with Image.open(temp_image) as saved:
+        assert saved.format == 'JPEG'
+        assert saved.size == (300, 200)
+    assert not os.path.exists(f"{temp_image}.tmp")
+    assert not os.path.exists(editor._proxy_sidecar_path(temp_image))
+    
+    # Thumbnail is regenerated from the saved image and the gallery reuses it
+    thumb_path = f"{temp_image}.thumb.jpg"
+    try:
+        thumb_mtime = os.stat(thumb_path).st_mtime_ns
+        assert engine.get_thumbnail(temp_image) == thumb_path
+        assert os.stat(thumb_path).st_mtime_ns == thumb_mtime
+        with Image.open(thumb_path) as thumb:
+            assert thumb.size == (300, 200)
+    finally:
+        os.unlink(thumb_path)
+
+def test_atomic_save_failed(temp_image):
+    """Test failed save raises, keeps the original and leaves no temp file"""
+    # Розширення без енкодера Pillow — encode падає до os.replace
+    path = f"{temp_image}.xyz"
+    with open(temp_image, 'rb') as src, open(path, 'wb') as dst:
+        original = src.read()
+        dst.write(original)
+    
+    try:
+        with pytest.raises(ValueError):
+            editor._atomic_save(Image.new('RGB', (10, 10)), path, {})
+        assert not os.path.exists(f"{path}.tmp")
+        with open(path, 'rb') as f:
+            assert f.read() == original
+    finally:
+        os.unlink(path)
+
+# === CROP BOX TESTS ===
+
+def test_get_max_box_free():
+    """Test free aspect leaves padding"""
+    assert editor.get_max_box(800, 600, None) == (10, 10, 780, 580)
+
+def test_get_max_box_square():
+    """Test square box is centered in landscape image"""
+    assert editor.get_max_box(800, 600, (1, 1)) == (100, 0, 600, 600)
+
+def test_get_max_box_wide():
+    """Test 16:9 box fits by width"""
+    assert editor.get_max_box(800, 600, (16, 9)) == (0, 75, 800, 450)
+
+def test_get_max_box_exact_integer():
+    """Test box sides are floored exact ratios"""
+    assert editor.get_max_box(1000, 1000, (16, 9)) == (0, 219, 1000, 562)
+    assert editor.get_max_box(700, 1000, (3, 2)) == (0, 267, 700, 466)
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
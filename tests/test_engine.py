@@ -186,6 +186,23 @@ def test_thumbnail_generation(temp_image):
     thumb2 = engine.get_thumbnail(temp_image)
     assert thumb == thumb2
 
+def test_thumbnail_exif_orientation():
+    """Test thumbnail follows EXIF orientation"""
+    img = Image.new('RGB', (800, 400), color='white')
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
+        img.save(f.name, 'JPEG', exif=exif)
+        path = f.name
+    
+    try:
+        thumb = engine.get_thumbnail(path)
+        with Image.open(thumb) as t:
+            assert t.size == (150, 300)
+    finally:
+        engine.remove_thumbnail(path)
+        os.unlink(path)
+
 def test_thumbnail_removal(temp_image):
     """Test thumbnail removal"""
     thumb = engine.get_thumbnail(temp_image)
@@ -124,6 +124,8 @@ TRANSLATIONS = {
         "lbl_aspect": "Пропорції",
         "btn_save_edit": "💾 Зберегти зміни",
         "msg_edit_saved": "✅ Зміни збережено!",
+        "msg_saving": "Збереження...",
+        "chk_archive_quality": "🗄 Архівна якість (повільніше)",
 
         # Language
         "lang_select": "Мова інтерфейсу / Interface Language",
@@ -274,6 +276,8 @@ TRANSLATIONS = {
         "lbl_aspect": "Aspect Ratio",
         "btn_save_edit": "💾 Save Changes",
         "msg_edit_saved": "✅ Changes saved!",
+        "msg_saving": "Saving...",
+        "chk_archive_quality": "🗄 Archive quality (slower)",
 
         # Language
         "lang_select": "Interface Language / Мова інтерфейсу",
@@ -145,6 +145,19 @@ def generate_filename(
         return f"output_{index:03d}.{extension}"
 
 
+# === EXIF ORIENTATION ===
+
+def _exif_oriented(img: Image.Image) -> Image.Image:
+    """
+    Apply EXIF orientation.
+    Без тегу повороту (найчастіше) повертає сам img — exif_transpose
+    зробив би повнокадрову copy().
+    """
+    if img.getexif().get(0x0112, 1) == 1:
+        return img
+    return ImageOps.exif_transpose(img)
+
+
 # === THUMBNAIL ===
 
 def get_thumbnail(file_path: str, size: Tuple[int, int] = None) -> Optional[str]:
@@ -158,15 +171,38 @@ def get_thumbnail(file_path: str, size: Tuple[int, int] = None) -> Optional[str]
     thumb_path = f"{file_path}.thumb.jpg"
 
     try:
-        if os.path.exists(thumb_path):
+        # Галерея викликає це на кожен rerun: один stat замість exists + getmtime
+        try:
             if os.path.getmtime(thumb_path) > os.path.getmtime(file_path):
                 return thumb_path
+        except FileNotFoundError:
+            pass
 
+        # Без EXIF-повороту write_thumbnail отримує ще не декодований файл:
+        # thumbnail() сам робить JPEG draft (декодування в 1/2–1/8 масштабі)
         with Image.open(file_path) as img_temp:
-            img = ImageOps.exif_transpose(img_temp)
+            return write_thumbnail(_exif_oriented(img_temp), file_path, size)
+
+    except Exception as e:
+        logger.error(f"Thumbnail generation failed for {file_path}: {e}")
+        return None
+
+
+def write_thumbnail(img: Image.Image, file_path: str, size: Tuple[int, int] = None) -> Optional[str]:
+    """
+    Write thumbnail for file_path from an already decoded image.
+    Image is downscaled in place — pass a copy if it is still needed.
+    """
+    if size is None:
+        size = config.THUMBNAIL_SIZE
+
+    thumb_path = f"{file_path}.thumb.jpg"
+
+    try:
+        if img.mode != 'RGB':
             img = img.convert('RGB')
-            img.thumbnail(size, Image.Resampling.LANCZOS)
-            img.save(thumb_path, "JPEG", quality=70, optimize=True)
+        img.thumbnail(size, Image.Resampling.LANCZOS)
+        img.save(thumb_path, "JPEG", quality=70, optimize=True)
 
         logger.debug(f"Thumbnail created: {thumb_path}")
         return thumb_path
@@ -180,8 +216,9 @@ def remove_thumbnail(file_path: str) -> bool:
     """Safely remove thumbnail file"""
     thumb_path = f"{file_path}.thumb.jpg"
     try:
-        if os.path.exists(thumb_path):
-            os.remove(thumb_path)
+        os.unlink(thumb_path)
+        return True
+    except FileNotFoundError:
         return True
     except (PermissionError, OSError) as e:
         logger.warning(f"Could not remove thumbnail {thumb_path}: {e}")
@@ -202,7 +239,7 @@ def rotate_image_file(file_path: str, angle: int) -> bool:
         is_heic = ext in ('.heic', '.heif')
 
         with Image.open(file_path) as img_temp:
-            img = ImageOps.exif_transpose(img_temp)
+            img = _exif_oriented(img_temp)
             exif_data = img.info.get('exif')
             rotated = img.rotate(-angle, expand=True, resample=Image.BICUBIC)
 
@@ -396,7 +433,7 @@ def process_image(
         validate_image_file(file_path)
 
         with Image.open(file_path) as img_temp:
-            img = ImageOps.exif_transpose(img_temp)
+            img = _exif_oriented(img_temp)
             exif_data = img.info.get('exif')
             orig_w, orig_h = img.size
             orig_size = os.path.getsize(file_path)